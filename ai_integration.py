@@ -1,13 +0,0 @@
-import requests
-
-def format_data(fields, api_key):
-    prompt = f"Clean and format this data: {fields}"
-    response = requests.post(
-        "https://openrouter.ai/api/v1/chat/completions",
-        headers={"Authorization": f"Bearer {api_key}"},
-        json={
-            "model": "DeepSeek:R1:free",
-            "messages": [{"role": "user", "content": prompt}]
-        }
-    )
-    return response.json()["choices"][0]["message"]["content"]
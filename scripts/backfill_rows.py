@@ -0,0 +1,37 @@
+# One-off backfill for records saved before model output was parsed at write
+# time: re-parses model_raw and stores the result in `rows`.
+#
+# Run from the repo root:  python -m scripts.backfill_rows
+import os
+
+from dotenv import load_dotenv
+from pymongo import MongoClient, UpdateOne
+
+from snaplytics.llm import parse_model_json
+
+BATCH_SIZE = 500
+
+
+def main():
+    load_dotenv()
+    collection = MongoClient(os.environ["MONGO_URI"])["snaplytics_db"]["scraped_data"]
+    query = {
+        "$or": [{"rows": {"$exists": False}}, {"rows": {"$size": 0}}],
+        "model_raw": {"$type": "string"},
+    }
+    ops = []
+    updated = 0
+    for d in collection.find(query, {"model_raw": 1}):
+        rows = parse_model_json(d["model_raw"])
+        if rows:
+            ops.append(UpdateOne({"_id": d["_id"]}, {"$set": {"rows": rows}}))
+        if len(ops) >= BATCH_SIZE:
+            updated += collection.bulk_write(ops, ordered=False).modified_count
+            ops = []
+    if ops:
+        updated += collection.bulk_write(ops, ordered=False).modified_count
+    print(f"Backfilled rows on {updated} records")
+
+
+if __name__ == "__main__":
+    main()
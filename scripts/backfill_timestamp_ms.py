@@ -0,0 +1,45 @@
+# One-off backfill for records saved before timestamps were stored as epoch
+# milliseconds: derives `timestamp_ms` from the ISO `timestamp` string so older
+# records stay visible to the timestamp_ms-sorted, paginated read endpoints.
+#
+# Run from the repo root:  python -m scripts.backfill_timestamp_ms
+import os
+from datetime import datetime, timezone
+
+from dotenv import load_dotenv
+from pymongo import MongoClient, UpdateOne
+
+BATCH_SIZE = 500
+
+
+def to_ms(timestamp):
+    try:
+        dt = datetime.fromisoformat(timestamp)
+    except (TypeError, ValueError):
+        return None
+    if dt.tzinfo is None:
+        # the oldest records used naive datetime.now(); treat them as UTC
+        dt = dt.replace(tzinfo=timezone.utc)
+    return int(dt.timestamp() * 1000)
+
+
+def main():
+    load_dotenv()
+    collection = MongoClient(os.environ["MONGO_URI"])["snaplytics_db"]["scraped_data"]
+    query = {"timestamp_ms": {"$exists": False}, "timestamp": {"$type": "string"}}
+    ops = []
+    updated = 0
+    for d in collection.find(query, {"timestamp": 1}):
+        ms = to_ms(d["timestamp"])
+        if ms is not None:
+            ops.append(UpdateOne({"_id": d["_id"]}, {"$set": {"timestamp_ms": ms}}))
+        if len(ops) >= BATCH_SIZE:
+            updated += collection.bulk_write(ops, ordered=False).modified_count
+            ops = []
+    if ops:
+        updated += collection.bulk_write(ops, ordered=False).modified_count
+    print(f"Backfilled timestamp_ms on {updated} records")
+
+
+if __name__ == "__main__":
+    main()
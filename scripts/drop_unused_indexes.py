@@ -0,0 +1,46 @@
+# Drops scraped_data indexes that have served no queries. Every index adds
+# B-tree maintenance to each insert, so orphans left behind by refactors slow
+# the write path for nothing.
+#
+# Skips _id_, unique indexes, and the indexes the app creates itself, and only
+# considers indexes whose $indexStats counters have been collecting for at
+# least --min-age-days. Dry run unless --apply is passed.
+#
+# Run from the repo root:  python -m scripts.drop_unused_indexes [--apply]
+import argparse
+import os
+from datetime import datetime, timedelta
+
+from dotenv import load_dotenv
+from pymongo import MongoClient
+
+from snaplytics.db import INDEXES, index_name
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--apply", action="store_true", help="actually drop the indexes")
+    parser.add_argument("--min-age-days", type=int, default=7)
+    args = parser.parse_args()
+
+    load_dotenv()
+    collection = MongoClient(os.environ["MONGO_URI"])["snaplytics_db"]["scraped_data"]
+    info = collection.index_information()
+    keep = {"_id_"} | {index_name(keys) for keys in INDEXES}
+    cutoff = datetime.utcnow() - timedelta(days=args.min_age_days)
+
+    for s in collection.aggregate([{"$indexStats": {}}]):
+        name = s["name"]
+        if name in keep or info.get(name, {}).get("unique"):
+            continue
+        if s["accesses"]["ops"] > 0 or s["accesses"]["since"] > cutoff:
+            continue
+        if args.apply:
+            collection.drop_index(name)
+            print(f"Dropped {name}")
+        else:
+            print(f"Would drop {name} (no ops since {s['accesses']['since']:%Y-%m-%d})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,8 @@
+import os
+
+# Load .env for local development (Vercel uses dashboard env vars in production).
+# Done here so every submodule sees the same environment at import time.
+if not os.getenv("VERCEL"):
+    from dotenv import load_dotenv
+
+    load_dotenv()
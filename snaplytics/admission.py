@@ -0,0 +1,126 @@
+import asyncio
+import contextlib
+import email.utils
+import os
+import time
+from collections import deque
+
+# AIMD admission control for OpenRouter: the number of concurrent upstream
+# calls grows by 0.5 every WINDOW calls while mean time-to-headers stays under
+# TARGET_LATENCY_SECONDS, and halves when it degrades or the provider answers
+# 429/5xx. Time-to-headers tracks provider queueing; the full streamed R1
+# generation (10-60s) depends mostly on output length, so it isn't measured.
+# Retry-After and a nearly exhausted x-ratelimit-remaining-* budget pause new
+# calls instead of letting every waiter hit the limit again.
+
+INITIAL_LIMIT = float(os.getenv("LLM_CONCURRENCY", "8"))
+MIN_LIMIT = 2
+MAX_LIMIT = 64
+WINDOW = 50
+TARGET_LATENCY_SECONDS = float(os.getenv("LLM_TARGET_LATENCY", "8"))
+LOW_REMAINING_RATIO = 0.1
+DEFAULT_PAUSE_SECONDS = 1.0
+
+
+def _retry_after_seconds(value):
+    # Retry-After is either delta-seconds or an HTTP date
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _reset_seconds(value):
+    # x-ratelimit-reset is an epoch timestamp in ms on OpenRouter; accept seconds too
+    try:
+        reset = float(value)
+    except (TypeError, ValueError):
+        return None
+    if reset > 1e11:
+        reset /= 1000
+    return max(0.0, reset - time.time())
+
+
+class AdmissionController:
+    def __init__(self, initial=INITIAL_LIMIT, min_limit=MIN_LIMIT, max_limit=MAX_LIMIT,
+                 window=WINDOW, target_latency=TARGET_LATENCY_SECONDS):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.limit = min(max_limit, max(min_limit, initial))
+        self.target_latency = target_latency
+        self.in_flight = 0
+        self._latencies = deque(maxlen=window)
+        self._paused_until = 0.0
+        self._cond = asyncio.Condition()
+        # strong refs so pending wake-ups aren't garbage-collected
+        self._wakers = set()
+
+    @contextlib.asynccontextmanager
+    async def slot(self):
+        async with self._cond:
+            await self._cond.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+        try:
+            delay = self._paused_until - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            # the caller passes this back to on_response
+            yield time.monotonic()
+        finally:
+            async with self._cond:
+                self.in_flight -= 1
+                self._cond.notify_all()
+
+    def _observe_latency(self, seconds):
+        self._latencies.append(seconds)
+        if len(self._latencies) < self._latencies.maxlen:
+            return
+        if sum(self._latencies) / len(self._latencies) <= self.target_latency:
+            self._set_limit(self.limit + 0.5)
+        else:
+            self._set_limit(self.limit * 0.5)
+        self._latencies.clear()
+
+    def _set_limit(self, limit):
+        grew = limit > self.limit
+        self.limit = min(self.max_limit, max(self.min_limit, limit))
+        if grew:
+            # wake waiters outside the slot's lock; the condition re-checks the limit
+            task = asyncio.get_running_loop().create_task(self._wake())
+            self._wakers.add(task)
+            task.add_done_callback(self._wakers.discard)
+
+    async def _wake(self):
+        async with self._cond:
+            self._cond.notify_all()
+
+    def _pause(self, seconds):
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def on_response(self, status_code, headers, started):
+        # Called with the upstream status and headers of every OpenRouter
+        # response, and the time its slot was granted.
+        if status_code == 429 or status_code >= 500:
+            self._set_limit(self.limit * 0.5)
+            self._latencies.clear()
+            pause = _retry_after_seconds(headers.get("retry-after"))
+            self._pause(DEFAULT_PAUSE_SECONDS if pause is None else pause)
+            return
+        self._observe_latency(time.monotonic() - started)
+        try:
+            remaining = float(headers["x-ratelimit-remaining-requests"])
+            quota = float(headers["x-ratelimit-limit-requests"])
+        except (KeyError, TypeError, ValueError):
+            return
+        if quota > 0 and remaining / quota < LOW_REMAINING_RATIO:
+            pause = _reset_seconds(headers.get("x-ratelimit-reset-requests"))
+            self._pause(DEFAULT_PAUSE_SECONDS if pause is None else pause)
+
+
+controller = AdmissionController()
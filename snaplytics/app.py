@@ -0,0 +1,348 @@
+import asyncio
+import hmac
+import os
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Optional
+
+import orjson
+from fastapi import FastAPI, Header, HTTPException, Query, Request, Response
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from pydantic import BaseModel
+from starlette.datastructures import Headers
+
+from . import db
+from .request_compression import RequestDecompressionMiddleware
+
+app = FastAPI(default_response_class=ORJSONResponse)
+
+# --- CORS ---
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["https://snaplytics-frontend.vercel.app"],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+# --- Response compression (records/rows JSON compresses ~5-10x) ---
+# /process NDJSON is sent uncompressed: GZipMiddleware holds the response
+# headers until the first body chunk, which there only comes after the LLM
+# call. The user-data NDJSON streams start immediately and stay compressed.
+class _GZipExceptProcessNDJSON(GZipMiddleware):
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"] == "/process":
+            if "application/x-ndjson" in Headers(scope=scope).get("accept", ""):
+                return await self.app(scope, receive, send)
+        await super().__call__(scope, receive, send)
+
+
+app.add_middleware(_GZipExceptProcessNDJSON, minimum_size=1024, compresslevel=5)
+
+# --- Request decompression (extension may send rawContent as gzip/br) ---
+app.add_middleware(RequestDecompressionMiddleware)
+
+
+# The LLM stack (httpx, caches, batcher) is imported inside the handlers that
+# use it, so a cold start serving /health only pays for FastAPI itself.
+@app.on_event("shutdown")
+async def _shutdown():
+    await db.stop_writer()
+    llm = sys.modules.get(f"{__package__}.llm")
+    if llm is not None:
+        await llm.close_http_client()
+
+
+# --- Auth Verify URL (Node.js backend endpoint) ---
+AUTH_VERIFY_URL = os.getenv("AUTH_VERIFY_URL")
+
+
+class ScrapeData(BaseModel):
+    fields: list[str]
+    rawContent: str
+    userEmail: Optional[str] = None
+
+
+# --- MAIN ENDPOINT ---
+# model_raw (the model's full reply) is only stored when parsing produced no
+# rows, which is when it's needed for debugging or a later backfill.
+# STORE_MODEL_RAW=1 keeps it on every record.
+STORE_MODEL_RAW = os.getenv("STORE_MODEL_RAW") == "1"
+MIN_RAW_CONTENT_CHARS = 32
+MAX_RAW_CONTENT_CHARS = 1024 * 1024
+
+
+# `Accept: application/x-ndjson` streams the extracted rows one per line
+# instead of returning a single JSON body.
+def _wants_ndjson(request):
+    return "application/x-ndjson" in request.headers.get("accept", "")
+
+
+@app.post("/process")
+async def process_scrape_data(
+    data: ScrapeData,
+    request: Request,
+    response: Response,
+    authorization: Optional[str] = Header(None),
+):
+    # oversized pages are refused rather than truncated
+    if len(data.rawContent) > MAX_RAW_CONTENT_CHARS:
+        raise HTTPException(status_code=413, detail="rawContent too large")
+
+    from . import pipeline
+
+    api_key = os.getenv("OPENROUTER_KEY")
+    if not api_key:
+        raise HTTPException(status_code=500, detail="Missing OpenRouter API key")
+    # Writes use the extension-supplied userEmail. If the caller also sends a
+    # token, verify it while the LLM call is already in flight.
+    verify = None
+    if authorization and AUTH_VERIFY_URL:
+        from .auth import verify_token_async
+        verify = asyncio.create_task(verify_token_async(AUTH_VERIFY_URL, authorization))
+    elif not data.userEmail:
+        raise HTTPException(status_code=401, detail="Missing userEmail in payload")
+
+    # Degenerate inputs (nothing to extract) skip all LLM work but still go
+    # through the identity checks below.
+    llm_task = None
+    if data.fields and len(data.rawContent.strip()) >= MIN_RAW_CONTENT_CHARS:
+        content, content_hash = await asyncio.to_thread(pipeline.prepare_content, data.rawContent)
+        llm_task = asyncio.create_task(
+            pipeline.format_data_with_deepseek(data.fields, content, api_key, content_hash)
+        )
+
+    def _abort():
+        if llm_task is not None:
+            llm_task.cancel()
+
+    user_email = data.userEmail
+    if verify is not None:
+        try:
+            user_info = await verify
+        except BaseException:
+            _abort()
+            raise
+        if not user_info:
+            _abort()
+            raise HTTPException(status_code=401, detail="Invalid or expired token")
+        user_email = user_info.get("email") or user_email
+        if not user_email:
+            _abort()
+            raise HTTPException(status_code=401, detail="Missing userEmail in payload")
+
+    if llm_task is None:
+        return {
+            "status": "no_rows",
+            "userEmail": user_email,
+            "rows": [],
+            "timestamp": None,
+            "db_status": "skipped"
+        }
+
+    if _wants_ndjson(request):
+        return StreamingResponse(
+            _ndjson_process(llm_task, data.fields, user_email, content_hash),
+            media_type="application/x-ndjson",
+        )
+
+    rows, timestamp_ms, db_status, cache_status = await _finish_process(
+        llm_task, data.fields, user_email, content_hash
+    )
+    response.headers["X-Cache"] = cache_status
+    return {
+        "status": "success",
+        "userEmail": user_email,
+        "rows": rows,
+        "timestamp": _iso(timestamp_ms),
+        "timestamp_ms": timestamp_ms,
+        "db_status": db_status
+    }
+
+
+def _iso(timestamp_ms):
+    # Records store epoch milliseconds; ISO strings are only built for responses.
+    return datetime.fromtimestamp(timestamp_ms / 1000, tz=timezone.utc).isoformat()
+
+
+async def _finish_process(llm_task, fields, user_email, content_hash):
+    rows, raw_text, cache_status = await llm_task
+    timestamp_ms = time.time_ns() // 1_000_000
+
+    doc = {
+        "userEmail": user_email,
+        "fields_requested": fields,
+        "rows": rows,
+        "content_hash": content_hash,
+        "timestamp_ms": timestamp_ms
+    }
+    if STORE_MODEL_RAW or not rows:
+        doc["model_raw"] = raw_text
+    db_status = await db.save_record(doc)
+    return rows, timestamp_ms, db_status, cache_status
+
+
+async def _ndjson_process(llm_task, fields, user_email, content_hash):
+    # The response starts (headers, uncompressed) as soon as auth passes, so
+    # proxies see a live connection while DeepSeek is generating. Rows are not
+    # parsed incrementally: they follow, one per line, once the extraction has
+    # finished, then a summary line carrying what the JSON body and X-Cache
+    # header would.
+    try:
+        rows, timestamp_ms, db_status, cache_status = await _finish_process(
+            llm_task, fields, user_email, content_hash
+        )
+    except BaseException:
+        llm_task.cancel()
+        raise
+    for row in rows:
+        yield orjson.dumps({"row": row}) + b"\n"
+    yield orjson.dumps({
+        "status": "success",
+        "userEmail": user_email,
+        "count": len(rows),
+        "timestamp": _iso(timestamp_ms),
+        "timestamp_ms": timestamp_ms,
+        "db_status": db_status,
+        "cache": cache_status
+    }) + b"\n"
+
+
+# --- FETCH USER DATA ---
+# Newest first, `limit` records per page. Pass `next_cursor` back as `cursor`
+# to get the next page: keyset pagination on (timestamp_ms, _id), so records
+# stamped in the same millisecond aren't skipped and no skip() is needed.
+# `timestamp` is formatted from timestamp_ms here rather than stored.
+# Clients that send `Accept: application/x-ndjson` get one record per line,
+# streamed straight off the Mongo cursor instead of one buffered JSON body,
+# and a final {"next_cursor": ...} line.
+async def _ndjson_records(cursor, transform, limit):
+    # one line per record, then a {"next_cursor": ...} summary line
+    count, last = 0, None
+    async for d in cursor:
+        # keep the cursor fields; transform drops _id
+        count, last = count + 1, {k: d[k] for k in ("timestamp_ms", "_id") if k in d}
+        yield orjson.dumps(transform(d)) + b"\n"
+    next_cursor = _next_cursor([last], 1) if count == limit else None
+    yield orjson.dumps({"next_cursor": next_cursor}) + b"\n"
+
+
+def _find_page(collection, query, limit, cursor):
+    if cursor:
+        from bson import ObjectId
+        from bson.errors import InvalidId
+
+        try:
+            ms, _, oid = cursor.partition("_")
+            ms, oid = int(ms), ObjectId(oid)
+        except (ValueError, InvalidId):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        query = {**query, "$or": [
+            {"timestamp_ms": {"$lt": ms}},
+            {"timestamp_ms": ms, "_id": {"$lt": oid}},
+        ]}
+    return (
+        collection.find(query, {"model_raw": 0})
+        .sort([("timestamp_ms", -1), ("_id", -1)])
+        .limit(limit)
+        .batch_size(min(limit, 100))
+    )
+
+
+def _with_iso(d):
+    # _id is only fetched for the cursor
+    d.pop("_id", None)
+    if "timestamp_ms" in d:
+        d["timestamp"] = _iso(d["timestamp_ms"])
+    return d
+
+
+def _next_cursor(docs, limit):
+    if len(docs) < limit or "timestamp_ms" not in docs[-1]:
+        return None
+    return f"{docs[-1]['timestamp_ms']}_{docs[-1]['_id']}"
+
+
+@app.get("/get_user_data/{userId}")
+async def get_user_data(
+    userId: str,
+    request: Request,
+    limit: int = Query(db.USER_DATA_LIMIT, ge=1, le=db.MAX_USER_DATA_LIMIT),
+    cursor: Optional[str] = None,
+):
+    collection = db.get_collection()
+    if collection is None:
+        return {"status": "error", "message": "DB not configured"}
+    records = _find_page(collection, {"userId": userId}, limit, cursor)
+    if _wants_ndjson(request):
+        return StreamingResponse(_ndjson_records(records, _with_iso, limit), media_type="application/x-ndjson")
+    docs = await records.to_list(length=limit)
+    next_cursor = _next_cursor(docs, limit)
+    docs = [_with_iso(d) for d in docs]
+    return {
+        "status": "success" if docs else "no_data",
+        "userId": userId,
+        "records": docs,
+        "count": len(docs),
+        "next_cursor": next_cursor
+    }
+
+
+@app.get("/get_user_data_by_email/{email}")
+async def get_user_data_by_email(
+    email: str,
+    request: Request,
+    limit: int = Query(db.USER_DATA_LIMIT, ge=1, le=db.MAX_USER_DATA_LIMIT),
+    cursor: Optional[str] = None,
+):
+    collection = db.get_collection()
+    if collection is None:
+        return {"status": "error", "message": "DB not configured"}
+    records = _find_page(collection, {"userEmail": email}, limit, cursor)
+
+    def _normalize(d):
+        # rows are parsed at write time; parsed_rows is kept for older frontends
+        return {**_with_iso(d), "parsed_rows": d.get("rows") or []}
+
+    if _wants_ndjson(request):
+        return StreamingResponse(_ndjson_records(records, _normalize, limit), media_type="application/x-ndjson")
+    docs = await records.to_list(length=limit)
+    next_cursor = _next_cursor(docs, limit)
+    normalized = [_normalize(d) for d in docs]
+
+    return {
+        "status": "success" if normalized else "no_data",
+        "userEmail": email,
+        "records": normalized,
+        "count": len(normalized),
+        "next_cursor": next_cursor
+    }
+
+
+# --- Admin ---
+# Hidden (404) unless ADMIN_TOKEN is set and sent back as X-Admin-Token.
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+
+@app.get("/_admin/index_stats")
+async def index_stats(x_admin_token: Optional[str] = Header(None)):
+    # compared as bytes: compare_digest raises TypeError on non-ASCII str
+    if not ADMIN_TOKEN or not hmac.compare_digest((x_admin_token or "").encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=404, detail="Not Found")
+    if db.get_collection() is None:
+        return {"status": "error", "message": "DB not configured"}
+    stats = await db.index_stats()
+    return {
+        "status": "success",
+        "indexes": stats,
+        "unused": [s["name"] for s in stats if s["ops"] == 0],
+    }
+
+
+# --- Health Check ---
+@app.get("/health")
+def health_check():
+    return {"status": "healthy", "service": "Snaplytics (MongoDB Ready)"}
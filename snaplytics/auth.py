@@ -0,0 +1,36 @@
+import hashlib
+
+import orjson
+from cachetools import TTLCache
+
+from .llm import get_http_client
+
+# Token verification against the Node.js auth service. Imported only when a
+# request carries an Authorization header, so anonymous traffic and /health
+# never load it.
+
+# Successful verifications are reused for a minute, keyed by a digest of the
+# header so raw tokens aren't kept in memory. Rejections are never cached.
+_verified = TTLCache(maxsize=10000, ttl=60)
+
+
+async def verify_token_async(verify_url, authorization):
+    # Returns the user info from the auth service, or None if the token is rejected.
+    key = hashlib.blake2b(authorization.encode(), digest_size=16).digest()
+    user = _verified.get(key)
+    if user is not None:
+        return user
+    try:
+        r = await get_http_client().get(verify_url, headers={"Authorization": authorization}, timeout=10)
+        if r.status_code != 200:
+            return None
+        info = orjson.loads(r.content)
+    except Exception as e:
+        print(f"Warning: token verification failed: {e}")
+        return None
+    if not isinstance(info, dict):
+        return None
+    user = info.get("user")
+    user = user if isinstance(user, dict) else info
+    _verified[key] = user
+    return user
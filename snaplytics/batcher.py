@@ -0,0 +1,105 @@
+import asyncio
+import os
+
+import orjson
+
+from . import llm
+
+# Micro-batching for DeepSeek calls: requests with the same `fields` that
+# arrive within BATCH_WINDOW_SECONDS of each other share one prompt (up to
+# MAX_BATCH texts) and the `results` are fanned back out by item id. Items the
+# model drops from a batched reply are retried individually.
+# LLM_BATCH_WINDOW_MS=0 disables batching.
+
+BATCH_WINDOW_SECONDS = float(os.getenv("LLM_BATCH_WINDOW_MS", "30")) / 1000
+MAX_BATCH = 8
+
+# tuple(fields) -> {"items": [(raw_content, future)], "timer": TimerHandle, "api_key": str}
+_pending = {}
+# strong refs so in-flight dispatches aren't garbage-collected
+_dispatching = set()
+
+
+async def submit(fields, raw_content, api_key):
+    if BATCH_WINDOW_SECONDS <= 0:
+        return await llm.call_deepseek_async(fields, raw_content, api_key)
+
+    loop = asyncio.get_running_loop()
+    key = tuple(fields)
+    batch = _pending.get(key)
+    if batch is None:
+        batch = _pending[key] = {
+            "items": [],
+            "timer": loop.call_later(BATCH_WINDOW_SECONDS, _flush, key),
+            "api_key": api_key,
+        }
+    future = loop.create_future()
+    batch["items"].append((raw_content, future))
+    if len(batch["items"]) >= MAX_BATCH:
+        _flush(key)
+    return await future
+
+
+def _flush(key):
+    batch = _pending.pop(key, None)
+    if batch is None:
+        return
+    batch["timer"].cancel()
+    # waiters cancelled during the window (e.g. failed auth) aren't sent upstream
+    items = [(raw_content, future) for raw_content, future in batch["items"] if not future.done()]
+    if not items:
+        return
+    task = asyncio.create_task(_dispatch(list(key), items, batch["api_key"]))
+    _dispatching.add(task)
+    task.add_done_callback(_dispatching.discard)
+
+    def _abandon_if_unwanted(_):
+        # no one is left to receive the result: stop the upstream call
+        if all(future.cancelled() for _, future in items):
+            task.cancel()
+
+    for _, future in items:
+        future.add_done_callback(_abandon_if_unwanted)
+
+
+def _resolve(future, result):
+    # a waiter may have been cancelled (e.g. its token failed verification)
+    if not future.done():
+        future.set_result(result)
+
+
+async def _dispatch(fields, items, api_key):
+    try:
+        if len(items) == 1:
+            raw_content, future = items[0]
+            _resolve(future, await llm.call_deepseek_async(fields, raw_content, api_key))
+            return
+
+        texts = [raw_content for raw_content, _ in items]
+        try:
+            content, error = await llm.complete(llm.build_batch_messages(fields, texts), api_key)
+        except Exception as e:
+            content, error = None, f"Error formatting data: {str(e)}"
+        results = llm.parse_batch_json(content) if error is None else {}
+
+        retry = []
+        for i, (raw_content, future) in enumerate(items):
+            if i in results:
+                _resolve(future, (results[i], orjson.dumps({"rows": results[i]}).decode()))
+            else:
+                retry.append((raw_content, future))
+        if retry:
+            outcomes = await asyncio.gather(
+                *(llm.call_deepseek_async(fields, raw_content, api_key) for raw_content, _ in retry)
+            )
+            for (_, future), outcome in zip(retry, outcomes):
+                _resolve(future, outcome)
+    except BaseException as e:
+        for _, future in items:
+            if future.done():
+                continue
+            if isinstance(e, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(e)
+        raise
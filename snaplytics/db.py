@@ -0,0 +1,202 @@
+import asyncio
+import atexit
+import functools
+import os
+
+USER_DATA_LIMIT = 100
+MAX_USER_DATA_LIMIT = 500
+
+
+@functools.cache
+def get_db():
+    # One Motor client per process, built on first use rather than at import so
+    # cold starts (and /health) don't pay for DNS/TLS to Atlas; warm serverless
+    # invocations reuse it. Returns None when MONGO_URI isn't configured.
+    uri = os.getenv("MONGO_URI")
+    if not uri:
+        return None
+    try:
+        # import lazily so deployments that don't include motor won't fail at import time
+        from motor.motor_asyncio import AsyncIOMotorClient
+        # A serverless instance serves few concurrent requests, so a small pool
+        # and a short selection timeout; connect=False defers the handshake to
+        # the first operation. zstd shrinks the large model_raw strings on the
+        # wire; zlib is the fallback if the server or zstandard doesn't support it.
+        client = AsyncIOMotorClient(
+            uri,
+            maxPoolSize=5,
+            serverSelectionTimeoutMS=2000,
+            connect=False,
+            compressors="zstd,zlib",
+        )
+    except Exception as e:
+        print(f"Warning: could not connect to MongoDB or import motor: {e}")
+        return None
+    atexit.register(client.close)
+    return client["snaplytics_db"]
+
+
+@functools.cache
+def _get_collection():
+    database = get_db()
+    return None if database is None else database["scraped_data"]
+
+
+def get_collection():
+    collection = _get_collection()
+    if collection is not None and not _started:
+        _start_background()
+    return collection
+
+
+# --- Indexes for the per-user read endpoints and the content-hash lookup ---
+INDEXES = [
+    # _id is the tiebreak of the keyset cursor, so pages sort without a SORT stage
+    [("userEmail", 1), ("timestamp_ms", -1), ("_id", -1)],
+    [("userId", 1), ("timestamp_ms", -1), ("_id", -1)],
+    [("content_hash", 1), ("fields_requested", 1)],
+]
+
+
+def index_name(keys):
+    # pymongo's default name, e.g. "userEmail_1_timestamp_ms_-1__id_-1"
+    return "_".join(f"{field}_{direction}" for field, direction in keys)
+
+
+async def ensure_indexes():
+    collection = _get_collection()
+    if collection is None:
+        return
+    try:
+        for keys in INDEXES:
+            await collection.create_index(keys, background=True)
+    except Exception as e:
+        print(f"Warning: could not create MongoDB indexes: {e}")
+
+
+async def index_stats():
+    # Per-index usage since the server last restarted; ops == 0 means the index
+    # only costs writes.
+    cursor = get_collection().aggregate([
+        {"$indexStats": {}},
+        {"$project": {"name": 1, "accesses.ops": 1, "accesses.since": 1}},
+    ])
+    return [
+        {"name": s["name"], "ops": s["accesses"]["ops"], "since": s["accesses"]["since"]}
+        async for s in cursor
+    ]
+
+
+async def find_rows_by_hash(content_hash, fields):
+    # Rows from an earlier record with the same normalized content and fields.
+    collection = get_collection()
+    if collection is None:
+        return None
+    try:
+        doc = await collection.find_one(
+            {"content_hash": content_hash, "fields_requested": fields, "rows.0": {"$exists": True}},
+            {"_id": 0, "rows": 1},
+        )
+    except Exception as e:
+        print(f"Warning: content-hash lookup failed: {e}")
+        return None
+    return doc["rows"] if doc else None
+
+
+# --- Batched Mongo writes ---
+# /process only enqueues; a background task flushes with insert_many once the
+# batch is full or the oldest queued doc has waited WRITE_FLUSH_SECONDS.
+# Batches are written with w=1, j=False: acknowledged by the primary without
+# waiting for the journal fsync. These are re-derivable scrape results, so a
+# crash losing the last ~100ms of writes is acceptable.
+# On Vercel the instance can be frozen as soon as the response is sent, so a
+# queued doc may never be flushed; there every record is written inline.
+_SERVERLESS = bool(os.getenv("VERCEL"))
+WRITE_BATCH_SIZE = 500
+WRITE_FLUSH_SECONDS = 0.05
+_WRITE_Q = asyncio.Queue()
+_writer_task = None
+
+
+async def _insert_batch(batch):
+    from pymongo import WriteConcern
+
+    try:
+        collection = _get_collection().with_options(write_concern=WriteConcern(w=1, j=False))
+        await collection.insert_many(batch, ordered=False)
+    except Exception as e:
+        print(f"Warning: failed to write {len(batch)} docs to MongoDB: {e}")
+
+
+async def _mongo_writer():
+    loop = asyncio.get_running_loop()
+    batch = []
+    deadline = None
+    try:
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - loop.time())
+            try:
+                doc = await asyncio.wait_for(_WRITE_Q.get(), timeout)
+                if not batch:
+                    deadline = loop.time() + WRITE_FLUSH_SECONDS
+                batch.append(doc)
+            except asyncio.TimeoutError:
+                pass
+            if batch and (len(batch) >= WRITE_BATCH_SIZE or loop.time() >= deadline):
+                await _insert_batch(batch)
+                batch = []
+                deadline = None
+    finally:
+        # flush whatever is still buffered on shutdown
+        while not _WRITE_Q.empty():
+            batch.append(_WRITE_Q.get_nowait())
+        if batch:
+            await _insert_batch(batch)
+
+
+_started = False
+# strong refs so background tasks aren't garbage-collected
+_background = set()
+
+
+def _start_background():
+    # Index build and the batched writer start on first DB use inside the event
+    # loop rather than in a startup hook, so cold starts that never touch Mongo
+    # (e.g. /health) don't import motor at all.
+    global _started, _writer_task
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return
+    _started = True
+    index_task = asyncio.create_task(ensure_indexes())
+    _background.add(index_task)
+    index_task.add_done_callback(_background.discard)
+    if _SERVERLESS:
+        return
+    _writer_task = asyncio.create_task(_mongo_writer())
+
+
+async def stop_writer():
+    if _writer_task is not None:
+        _writer_task.cancel()
+        try:
+            await _writer_task
+        except asyncio.CancelledError:
+            pass
+
+
+async def save_record(doc):
+    # Returns the db_status reported back to the caller.
+    collection = get_collection()
+    if _writer_task is not None:
+        await _WRITE_Q.put(doc)
+        return "queued"
+    if collection is None:
+        return "skipped"
+    # no background writer (serverless, or no running loop) — write inline
+    try:
+        await collection.insert_one(doc)
+        return "saved"
+    except Exception as e:
+        return f"error: {str(e)}"
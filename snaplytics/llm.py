@@ -0,0 +1,216 @@
+import functools
+import json
+
+import httpx
+import orjson
+
+from .admission import controller
+
+OPENROUTER_URL = "https://openrouter.ai/api/v1/chat/completions"
+MODEL = "deepseek/deepseek-r1"
+
+# --- Shared HTTP client (one keep-alive pool for all OpenRouter calls) ---
+_http_client = None
+
+
+def get_http_client():
+    # created on first use so importing this module opens no sockets
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.AsyncClient(
+            timeout=60,
+            http2=True,
+            # idle connections stay warm for 30s so bursty traffic skips TLS
+            # handshakes; with brotli installed httpx also accepts br bodies
+            limits=httpx.Limits(
+                max_connections=200, max_keepalive_connections=50, keepalive_expiry=30
+            ),
+        )
+    return _http_client
+
+
+async def close_http_client():
+    if _http_client is not None:
+        await _http_client.aclose()
+
+
+# --- Prompt ---
+SYSTEM_PROMPT = (
+    "You are an expert data extractor. Output must be STRICT JSON only. "
+    "No markdown, no explanations. Use exactly the requested headers as keys. "
+    "If missing, leave blank. Return multiple `rows` if multiple items exist."
+)
+_TEXT_PLACEHOLDER = "__TEXT__"
+
+
+@functools.lru_cache(maxsize=256)
+def _skeleton(fields):
+    # The user payload serialized once per header tuple, split around the text
+    # value. "text" goes last so the headers/schema form a stable prompt prefix.
+    payload = {
+        "headers": list(fields),
+        "schema": {"rows": [{field: "string" for field in fields}]},
+        "output_format": {"rows": [{h: "" for h in fields}]},
+        "text": _TEXT_PLACEHOLDER,
+    }
+    head, _, tail = orjson.dumps(payload).decode().rpartition(f'"{_TEXT_PLACEHOLDER}"')
+    return head, tail
+
+
+# shared, never mutated: only the user message differs between requests
+_SYSTEM_MESSAGE = {"role": "system", "content": SYSTEM_PROMPT}
+
+
+def build_messages(fields, raw_content):
+    head, tail = _skeleton(tuple(fields))
+    return [
+        _SYSTEM_MESSAGE,
+        {"role": "user", "content": head + orjson.dumps(raw_content).decode() + tail}
+    ]
+
+
+BATCH_SYSTEM_PROMPT = SYSTEM_PROMPT + (
+    " The input holds several independent texts under `items`. Extract rows from"
+    " each one separately and return them under `results`, tagged with the"
+    " item's `id`."
+)
+_BATCH_SYSTEM_MESSAGE = {"role": "system", "content": BATCH_SYSTEM_PROMPT}
+
+
+@functools.lru_cache(maxsize=256)
+def _batch_skeleton(fields):
+    # Same idea as _skeleton: everything but `items` is serialized once per
+    # header tuple, and the items array is spliced in per batch.
+    payload = {
+        "headers": list(fields),
+        "schema": {"results": [{"id": 0, "rows": [{field: "string" for field in fields}]}]},
+        "output_format": {"results": [{"id": 0, "rows": [{h: "" for h in fields}]}]},
+        "items": _TEXT_PLACEHOLDER,
+    }
+    head, _, tail = orjson.dumps(payload).decode().rpartition(f'"{_TEXT_PLACEHOLDER}"')
+    return head, tail
+
+
+def build_batch_messages(fields, texts):
+    head, tail = _batch_skeleton(tuple(fields))
+    items = orjson.dumps([{"id": i, "text": text} for i, text in enumerate(texts)]).decode()
+    return [
+        _BATCH_SYSTEM_MESSAGE,
+        {"role": "user", "content": head + items + tail}
+    ]
+
+
+# --- Model output parsing ---
+def _loads_lenient(s):
+    try:
+        return orjson.loads(s)
+    except orjson.JSONDecodeError:
+        pass
+    # stdlib only on the failure path: strict=False accepts the raw newlines and
+    # tabs the model sometimes leaves inside string values
+    try:
+        return json.loads(s, strict=False)
+    except ValueError:
+        return None
+
+
+def _load_model_json(text):
+    # Parses the outermost {...} / [...] span in one pass. That span already
+    # excludes ```json fences and any prose around the JSON, so the text is
+    # never stripped or split first; the slice is the only copy.
+    obj, arr = text.find("{"), text.find("[")
+    if obj < 0 and arr < 0:
+        return None
+    # whichever bracket opens first is the top level (rows object or bare list)
+    if arr < 0 or 0 <= obj < arr:
+        i, j = obj, text.rfind("}")
+    else:
+        i, j = arr, text.rfind("]")
+    if j <= i:
+        return None
+    return _loads_lenient(text[i:j + 1])
+
+
+def parse_model_json(text):
+    if not text or not isinstance(text, str):
+        return []
+    payload = _load_model_json(text)
+    if isinstance(payload, dict) and isinstance(payload.get("rows"), list):
+        return payload["rows"]
+    if isinstance(payload, list):
+        return payload
+    return []
+
+
+def parse_batch_json(text):
+    # {"results": [{"id": 0, "rows": [...]}, ...]} -> {0: [...], ...}
+    payload = _load_model_json(text) if text and isinstance(text, str) else None
+    results = payload.get("results") if isinstance(payload, dict) else payload
+    by_id = {}
+    for item in results if isinstance(results, list) else []:
+        if isinstance(item, dict) and isinstance(item.get("id"), int) and isinstance(item.get("rows"), list):
+            by_id[item["id"]] = item["rows"]
+    return by_id
+
+
+# --- DeepSeek via OpenRouter ---
+async def complete(messages, api_key):
+    # Streams the completion (SSE) so the body is consumed while DeepSeek is
+    # still generating, instead of sitting idle until the whole reply is ready.
+    # Returns (content, error); exactly one of them is None.
+    # Every upstream call waits for an admission slot (see admission.py).
+    async with controller.slot() as started:
+        return await _stream_completion(messages, api_key, started)
+
+
+async def _sse_data(response):
+    # Yields the payload of each `data:` line as bytes, split straight off the
+    # byte stream so chunks are never decoded to str before orjson sees them.
+    # ": OPENROUTER PROCESSING" keep-alives and blank lines carry no data.
+    buffer = b""
+    async for chunk in response.aiter_bytes():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.startswith(b"data: "):
+                yield line[6:].rstrip(b"\r")
+
+
+async def _stream_completion(messages, api_key, started):
+    parts = []
+    async with get_http_client().stream(
+        "POST",
+        OPENROUTER_URL,
+        headers={
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json"
+        },
+        # serialized by orjson straight to bytes; httpx's json= goes through stdlib json
+        content=orjson.dumps({"model": MODEL, "messages": messages, "stream": True}),
+    ) as r:
+        controller.on_response(r.status_code, r.headers, started)
+        if r.status_code != 200:
+            await r.aread()
+            return None, f"Error: {r.status_code} - {r.text}"
+        async for chunk in _sse_data(r):
+            if chunk == b"[DONE]":
+                break
+            event = orjson.loads(chunk)
+            if "error" in event:
+                err = event["error"]
+                return None, f"Error: {err.get('message', err) if isinstance(err, dict) else err}"
+            for choice in event.get("choices") or []:
+                delta = (choice.get("delta") or {}).get("content")
+                if delta:
+                    parts.append(delta)
+    return "".join(parts), None
+
+
+async def call_deepseek_async(fields, raw_content, api_key):
+    try:
+        content, error = await complete(build_messages(fields, raw_content), api_key)
+    except Exception as e:
+        return [], f"Error formatting data: {str(e)}"
+    if error is not None:
+        return [], error
+    return parse_model_json(content), content
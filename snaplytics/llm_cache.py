@@ -0,0 +1,90 @@
+import hashlib
+import os
+from collections import OrderedDict
+from typing import Optional, Protocol
+
+import orjson
+
+# Exact-match cache for DeepSeek extraction results, keyed on the model, the
+# sorted fields and the normalized-content hash. Entries hold the parsed rows
+# plus the raw model text: {"rows": [...], "raw": "..."}.
+# Uses Redis when REDIS_URL is set, otherwise a per-process LRU.
+
+REDIS_URL = os.getenv("REDIS_URL")
+CACHE_TTL_SECONDS = int(os.getenv("LLM_CACHE_TTL", "14400"))
+CACHE_MAXSIZE = 1024
+
+
+class CacheBackend(Protocol):
+    async def get(self, key: str) -> Optional[bytes]: ...
+
+    async def set(self, key: str, value: bytes, ttl: int) -> None: ...
+
+
+class InMemoryLRU:
+    def __init__(self, maxsize: int = CACHE_MAXSIZE):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+
+    async def get(self, key):
+        value = self._data.get(key)
+        if value is not None:
+            self._data.move_to_end(key)
+        return value
+
+    async def set(self, key, value, ttl):
+        # entries are evicted by size only; TTL matters for the shared Redis cache
+        self._data[key] = value
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+
+class RedisBackend:
+    def __init__(self, url: str):
+        from redis import asyncio as aioredis
+        self._redis = aioredis.from_url(url)
+
+    async def get(self, key):
+        return await self._redis.get(f"llm:{key}")
+
+    async def set(self, key, value, ttl):
+        await self._redis.setex(f"llm:{key}", ttl, value)
+
+
+class LLMCache:
+    def __init__(self, backend: CacheBackend, ttl: int = CACHE_TTL_SECONDS):
+        self.backend = backend
+        self.ttl = ttl
+
+    @staticmethod
+    def key(model, fields, content_hash):
+        payload = {"model": model, "fields": sorted(fields), "content": content_hash}
+        return hashlib.sha256(orjson.dumps(payload, option=orjson.OPT_SORT_KEYS)).hexdigest()
+
+    async def get(self, key):
+        # Returns {"rows": [...], "raw": "..."} or None; backend errors count as a miss.
+        try:
+            cached = await self.backend.get(key)
+        except Exception as e:
+            print(f"Warning: LLM cache read failed: {e}")
+            return None
+        return orjson.loads(cached) if cached else None
+
+    async def set(self, key, rows, raw):
+        try:
+            await self.backend.set(key, orjson.dumps({"rows": rows, "raw": raw}), self.ttl)
+        except Exception as e:
+            print(f"Warning: LLM cache write failed: {e}")
+
+
+def _make_backend():
+    if REDIS_URL:
+        try:
+            return RedisBackend(REDIS_URL)
+        except Exception as e:
+            print(f"Warning: could not set up Redis cache, using in-process cache: {e}")
+    return InMemoryLRU()
+
+
+cache = LLMCache(_make_backend())
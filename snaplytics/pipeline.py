@@ -0,0 +1,182 @@
+import asyncio
+import hashlib
+import os
+import re
+import threading
+import time
+
+import orjson
+
+from . import batcher
+from . import db
+from . import llm
+from . import llm_cache
+from . import semantic_cache
+
+# rawContent is reduced to its visible text, whitespace-normalized and capped
+# before anything else sees it: fewer tokens for the LLM, smaller Mongo docs,
+# and identical pages hash equal.
+MAX_CONTENT_BYTES = int(os.getenv("MAX_CONTENT_BYTES", "32768"))
+MAX_CONTENT_TOKENS = int(os.getenv("MAX_CONTENT_TOKENS", "6000"))
+_WS = re.compile(r"[^\S\n]+")
+_NL = re.compile(r"\s*\n\s*")
+# raw HTML starts with markup; innerText that merely mentions a tag doesn't
+_HTML = re.compile(
+    r"\s*(?:<!--.*?-->\s*)*<(?:!doctype|html|head|body|main|div|table|section|article)\b",
+    re.IGNORECASE | re.DOTALL,
+)
+# never carry extractable text
+_NON_TEXT_TAGS = ["script", "style", "noscript", "svg", "template", "iframe"]
+# Text is joined the way a browser renders it (inline tags add no spacing);
+# block and row elements become line breaks and table cells a space, so
+# `<td>$<span>19</span>.99</td>` stays "$19.99" and rows stay one per line.
+_BLOCK_TAGS = (
+    "address, article, blockquote, br, dd, div, dl, dt, footer, h1, h2, h3, h4, h5, h6, "
+    "header, hr, li, main, ol, p, pre, section, table, tr, ul"
+)
+_CELL_TAGS = "td, th"
+
+
+def extract_main_text(raw_content):
+    # The extension usually sends innerText, but some pages arrive as raw HTML;
+    # markup, scripts and styles are pure token cost for the model.
+    if not _HTML.match(raw_content):
+        return raw_content
+    try:
+        from selectolax.parser import HTMLParser
+    except ImportError:
+        return raw_content
+    tree = HTMLParser(raw_content)
+    tree.strip_tags(_NON_TEXT_TAGS)
+    node = tree.body or tree.root
+    if node is None:
+        return ""
+    for block in node.css(_BLOCK_TAGS):
+        block.insert_before("\n")
+        block.insert_after("\n")
+    for cell in node.css(_CELL_TAGS):
+        cell.insert_after(" ")
+    return node.text(separator="")
+
+
+# cl100k_base is not DeepSeek's tokenizer, but it is close enough to bound the
+# prompt. tiktoken fetches the BPE file over the network (blocking, no timeout)
+# unless TIKTOKEN_CACHE_DIR already holds it, so it is loaded in a daemon
+# thread and requests are only byte-capped until it's ready. A failed load is
+# retried on later requests with exponential backoff.
+ENCODER_RETRY_MAX_SECONDS = 300
+_encoder = None
+_encoder_loading = False
+_encoder_retry_at = 0.0
+_encoder_backoff = 5.0
+
+
+def _load_encoder():
+    global _encoder, _encoder_loading, _encoder_retry_at, _encoder_backoff
+    try:
+        import tiktoken
+        _encoder = tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        print(f"Warning: tiktoken unavailable, retrying in {_encoder_backoff:.0f}s: {e}")
+        _encoder_retry_at = time.monotonic() + _encoder_backoff
+        _encoder_backoff = min(_encoder_backoff * 2, ENCODER_RETRY_MAX_SECONDS)
+        _encoder_loading = False
+
+
+def warm_encoder():
+    global _encoder_loading
+    if not _encoder_loading and time.monotonic() >= _encoder_retry_at:
+        _encoder_loading = True
+        threading.Thread(target=_load_encoder, daemon=True).start()
+
+
+def truncate_tokens(text, max_tokens=MAX_CONTENT_TOKENS):
+    enc = _encoder
+    if enc is None:
+        warm_encoder()
+        return text
+    tokens = enc.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    return enc.decode(tokens[:max_tokens])
+
+
+def normalize_content(raw_content):
+    text = extract_main_text(raw_content)
+    # collapse runs of spaces/tabs but keep line breaks, which often separate rows
+    text = _NL.sub("\n", _WS.sub(" ", text)).strip()
+    encoded = text.encode()
+    if len(encoded) > MAX_CONTENT_BYTES:
+        text = encoded[:MAX_CONTENT_BYTES].decode("utf-8", "ignore")
+    return text
+
+
+def prepare_content(raw_content):
+    # Returns (content for the prompt, content hash). The hash is taken before
+    # token truncation, which only applies once the encoder has loaded, so the
+    # same page hashes the same on every worker and cold start. CPU-bound on
+    # large pages; callers on the event loop run it via asyncio.to_thread.
+    text = normalize_content(raw_content)
+    return truncate_tokens(text), content_hash(text)
+
+
+def content_hash(content):
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+# cache key -> {"task": ..., "waiters": n}; concurrent identical misses await the
+# same task instead of each reaching Mongo / the semantic cache / OpenRouter.
+# The task is cancelled once every waiter has gone (e.g. all failed auth).
+_inflight = {}
+
+
+async def format_data_with_deepseek(fields, content, api_key, content_hash):
+    # Returns (rows, raw_text, cache_status) where cache_status is "HIT" or "MISS".
+    # Exact hit (memory/Redis) first, then joins an identical in-flight request,
+    # then previously stored records and near-duplicate content.
+    key = llm_cache.LLMCache.key(llm.MODEL, fields, content_hash)
+    cached = await llm_cache.cache.get(key)
+    if cached is not None:
+        return cached["rows"], cached["raw"], "HIT"
+
+    entry = _inflight.get(key)
+    leader = entry is None
+    if leader:
+        task = asyncio.create_task(_resolve(key, fields, content, api_key, content_hash))
+        entry = _inflight[key] = {"task": task, "waiters": 0}
+        task.add_done_callback(lambda _: _forget(key, entry))
+    entry["waiters"] += 1
+    try:
+        # shielded so one cancelled caller doesn't cancel the others' result
+        rows, raw_text, cache_status = await asyncio.shield(entry["task"])
+    except asyncio.CancelledError:
+        if entry["waiters"] == 1 and not entry["task"].done():
+            _forget(key, entry)
+            entry["task"].cancel()
+        raise
+    finally:
+        entry["waiters"] -= 1
+    return rows, raw_text, cache_status if leader else "HIT"
+
+
+def _forget(key, entry):
+    if _inflight.get(key) is entry:
+        del _inflight[key]
+
+
+async def _resolve(key, fields, content, api_key, content_hash):
+    rows = await db.find_rows_by_hash(content_hash, fields)
+    vector = None
+    if rows is None:
+        vector = await semantic_cache.embed(content)
+        rows = semantic_cache.lookup(fields, vector)
+    if rows is not None:
+        raw_text = orjson.dumps({"rows": rows}).decode()
+        await llm_cache.cache.set(key, rows, raw_text)
+        return rows, raw_text, "HIT"
+
+    rows, raw_text = await batcher.submit(fields, content, api_key)
+    if rows:
+        await llm_cache.cache.set(key, rows, raw_text)
+        semantic_cache.store(fields, vector, rows)
+    return rows, raw_text, "MISS"
@@ -0,0 +1,113 @@
+import os
+import zlib
+
+from fastapi.responses import ORJSONResponse
+
+# Pure ASGI middleware that inflates gzip/deflate/br request bodies before
+# FastAPI parses them, so the extension can compress large rawContent on the
+# upload hop. The inflated size is capped to guard against compression bombs.
+
+MAX_DECOMPRESSED_BYTES = int(os.getenv("MAX_DECOMPRESSED_BYTES", str(4 * 1024 * 1024)))
+
+
+# Each decompressor's process(data, limit) inflates at most limit + 1 bytes,
+# so crossing the cap is detected without materializing the rest of the body.
+class _Zlib:
+    def __init__(self, wbits):
+        self._d = zlib.decompressobj(wbits)
+
+    def process(self, data, limit):
+        return self._d.decompress(data, limit + 1)
+
+    def finished(self):
+        return self._d.eof
+
+
+class _Brotli:
+    def __init__(self):
+        import brotli
+        self._d = brotli.Decompressor()
+        if not hasattr(self._d, "can_accept_more_data"):
+            # brotli < 1.1 can't bound its output
+            raise ImportError("brotli>=1.1 required")
+
+    def process(self, data, limit):
+        out = self._d.process(data, output_buffer_limit=limit + 1)
+        parts, size = [out], len(out)
+        # output left buffered inside the decoder is drained with empty input
+        while size <= limit and not self._d.can_accept_more_data():
+            out = self._d.process(b"", output_buffer_limit=limit + 1 - size)
+            parts.append(out)
+            size += len(out)
+        return b"".join(parts)
+
+    def finished(self):
+        return self._d.is_finished()
+
+
+def _decompressor(encoding):
+    if encoding == "gzip":
+        return _Zlib(16 + zlib.MAX_WBITS)
+    if encoding == "deflate":
+        return _Zlib(zlib.MAX_WBITS)
+    if encoding == "br":
+        try:
+            return _Brotli()
+        except ImportError:
+            return None
+    return None
+
+
+class RequestDecompressionMiddleware:
+    def __init__(self, app, max_size=MAX_DECOMPRESSED_BYTES):
+        self.app = app
+        self.max_size = max_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        encoding = dict(scope["headers"]).get(b"content-encoding", b"").decode("latin-1").strip().lower()
+        if encoding in ("", "identity"):
+            return await self.app(scope, receive, send)
+
+        decompressor = _decompressor(encoding)
+        if decompressor is None:
+            response = ORJSONResponse({"detail": f"Unsupported Content-Encoding: {encoding}"}, status_code=415)
+            return await response(scope, receive, send)
+
+        parts = []
+        size = 0
+        more_body = True
+        try:
+            while more_body:
+                message = await receive()
+                if message["type"] == "http.disconnect":
+                    return
+                more_body = message.get("more_body", False)
+                data = decompressor.process(message.get("body", b""), self.max_size - size)
+                size += len(data)
+                if size > self.max_size:
+                    response = ORJSONResponse({"detail": "Request body too large"}, status_code=413)
+                    return await response(scope, receive, send)
+                parts.append(data)
+            if not decompressor.finished():
+                raise ValueError("truncated body")
+        except Exception:
+            response = ORJSONResponse({"detail": f"Malformed {encoding} request body"}, status_code=400)
+            return await response(scope, receive, send)
+
+        body = b"".join(parts)
+        headers = [
+            (k, v) for k, v in scope["headers"] if k not in (b"content-encoding", b"content-length")
+        ]
+        headers.append((b"content-length", str(len(body)).encode()))
+        sent = False
+
+        async def receive_inflated():
+            nonlocal sent
+            if not sent:
+                sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        await self.app({**scope, "headers": headers}, receive_inflated, send)
@@ -0,0 +1,82 @@
+import asyncio
+import functools
+import os
+
+# Near-duplicate cache: embeds the start of the content with MiniLM and reuses
+# the rows of a previous extraction whose fields cover the requested ones when
+# cosine similarity is above SEMANTIC_CACHE_THRESHOLD. Opt-in (SEMANTIC_CACHE=1)
+# because pages that share a template can embed closely while carrying
+# different values, and because sentence-transformers is too heavy for the
+# serverless bundle.
+
+ENABLED = os.getenv("SEMANTIC_CACHE") == "1"
+THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+EMBED_CHARS = 8192
+EMBED_DIM = 384
+MAX_ENTRIES_PER_SCHEMA = 1024
+
+# frozenset(fields) -> ring buffer of normalized vectors and their rows
+_buckets = {}
+
+
+@functools.cache
+def _model():
+    try:
+        from sentence_transformers import SentenceTransformer
+        return SentenceTransformer(MODEL_NAME)
+    except Exception as e:
+        print(f"Warning: semantic cache disabled, could not load {MODEL_NAME}: {e}")
+        return None
+
+
+def _embed(raw_content):
+    model = _model()
+    if model is None:
+        return None
+    return model.encode(raw_content[:EMBED_CHARS], normalize_embeddings=True).astype("float32")
+
+
+async def embed(raw_content):
+    if not ENABLED:
+        return None
+    # encoding is CPU-bound; keep it off the event loop
+    return await asyncio.to_thread(_embed, raw_content)
+
+
+def lookup(fields, vector):
+    # Searches every schema that covers the requested fields, then projects the
+    # best match's rows down to exactly those fields.
+    if vector is None:
+        return None
+    wanted = frozenset(fields)
+    best_score, best_rows = THRESHOLD, None
+    for schema, bucket in _buckets.items():
+        if bucket["size"] == 0 or not wanted <= schema:
+            continue
+        scores = bucket["vectors"][:bucket["size"]] @ vector
+        i = int(scores.argmax())
+        if scores[i] >= best_score:
+            best_score, best_rows = scores[i], bucket["rows"][i]
+    if best_rows is None:
+        return None
+    return [{f: row.get(f, "") for f in fields} for row in best_rows if isinstance(row, dict)]
+
+
+def store(fields, vector, rows):
+    if vector is None:
+        return
+    # numpy only loads once a vector exists, i.e. when the cache is enabled
+    import numpy as np
+
+    bucket = _buckets.setdefault(frozenset(fields), {
+        "vectors": np.zeros((MAX_ENTRIES_PER_SCHEMA, EMBED_DIM), dtype=np.float32),
+        "rows": [None] * MAX_ENTRIES_PER_SCHEMA,
+        "size": 0,
+        "next": 0,
+    })
+    slot = bucket["next"]
+    bucket["vectors"][slot] = vector
+    bucket["rows"][slot] = rows
+    bucket["next"] = (slot + 1) % MAX_ENTRIES_PER_SCHEMA
+    bucket["size"] = min(bucket["size"] + 1, MAX_ENTRIES_PER_SCHEMA)